@@ -2,8 +2,19 @@ from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from helpers import solve_captcha_and_search_with_status
 from webdriver import initialize_driver, quit_driver
+from cnr import parse_cnr, is_known_not_found, InvalidCNR
+from scheduler import scheduler, QuotaExceeded, is_known_api_key
+from http_cache import conditional_json_response
+from browser_watchdog import ensure_watchdog, gauges as watchdog_gauges
+from profiling import (
+    start_lookup, finish_lookup, recent_lookups, get_lookup,
+    set_profiling_enabled, is_profiling_enabled, SLOW_LOOKUP_SECONDS
+)
 import atexit
+import functools
+import hmac
 import json
+import os
 import time
 
 app = Flask(__name__)
@@ -18,6 +29,80 @@ except Exception as e:
     print(f"Failed to initialize WebDriver: {e}")
     exit(1)
 
+@app.before_request
+def start_background_workers():
+    """Start the browser watchdog lazily so it runs in the serving process, not the preload parent."""
+    ensure_watchdog()
+
+# Shared secret for the /api/admin/* endpoints; they are disabled when unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def admin_token_error():
+    """Return an error response if the request lacks the admin token (X-Admin-Token or Bearer), else None."""
+    if not ADMIN_TOKEN:
+        return jsonify({
+            'error': 'Admin endpoints are disabled; set ADMIN_TOKEN to enable them',
+            'status': 'failure'
+        }), 403
+    supplied = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if not supplied and authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    if not hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({
+            'error': 'Invalid admin token',
+            'status': 'failure'
+        }), 401
+    return None
+
+def require_admin_token(view):
+    """Reject requests without the admin token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        error_response = admin_token_error()
+        if error_response is not None:
+            return error_response
+        return view(*args, **kwargs)
+    return wrapper
+
+def is_profile_requested():
+    """X-Profile is honoured only together with a valid admin token; otherwise it is ignored."""
+    if request.headers.get('X-Profile', '').lower() not in ('1', 'true', 'yes'):
+        return False
+    return admin_token_error() is None
+
+def parse_bool(value):
+    """Parse a JSON/query boolean; returns None for anything unrecognised."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('0', 'false', 'no', 'off'):
+            return False
+    if isinstance(value, int):
+        return bool(value)
+    return None
+
+# How long the JSON endpoint waits for a browser session before giving up
+JSON_QUEUE_TIMEOUT = int(os.environ.get('JSON_QUEUE_TIMEOUT', 300))
+
+# How long /api/restart-driver waits for a running lookup to finish
+RESTART_DRAIN_TIMEOUT = int(os.environ.get('RESTART_DRAIN_TIMEOUT', 120))
+
+# Only trust X-Forwarded-For when running behind our own reverse proxy
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', '').lower() in ('1', 'true', 'yes')
+
+def get_client_id():
+    """Identify the caller for scheduling: a configured API key, otherwise client IP."""
+    api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
+    if api_key and is_known_api_key(api_key):
+        return f'key:{api_key}'
+    if TRUST_PROXY_HEADERS and request.access_route:
+        return f'ip:{request.access_route[0]}'
+    return f'ip:{request.remote_addr}'
+
 @app.route('/', methods=['GET'])
 def home():
     """
@@ -60,12 +145,21 @@ def home():
             <div class="endpoint">
                 <span class="method">GET</span> <code>/api/case-details</code> - Get case details with live status updates (SSE)
             </div>
+            <div class="endpoint">
+                <span class="method">GET</span> <code>/api/case-details/json</code> - Get case details as a single cacheable JSON response
+            </div>
             <div class="endpoint">
                 <span class="method">GET</span> <code>/api/health</code> - Health check endpoint
             </div>
             <div class="endpoint">
                 <span class="method">POST</span> <code>/api/restart-driver</code> - Restart WebDriver (admin endpoint)
             </div>
+            <div class="endpoint">
+                <span class="method">GET/POST</span> <code>/api/admin/profiling</code> - Show or toggle profiling of every lookup (admin endpoint)
+            </div>
+            <div class="endpoint">
+                <span class="method">GET</span> <code>/api/admin/slow-lookups</code> - Flight recorder of slow and profiled lookups (admin endpoint)
+            </div>
             
             <h2>🔍 Main API Endpoint</h2>
             <h3>GET /api/case-details</h3>
@@ -75,11 +169,26 @@ def home():
             <table>
                 <tr><th>Parameter</th><th>Type</th><th>Required</th><th>Description</th></tr>
                 <tr><td>cnr_number</td><td>string</td><td>Yes</td><td>The CNR number for which to fetch case details</td></tr>
+                <tr><td>api_key</td><td>string</td><td>No</td><td>Configured client key (<code>API_KEYS</code>) used for fair scheduling, or send the <code>X-API-Key</code> header; unknown keys and requests without one are scheduled by the caller's IP</td></tr>
             </table>
             
+            <h4>Scheduling and Quotas</h4>
+            <p>Browser sessions are shared fairly between clients. Each client may run one lookup at a time, queue a limited number more, and is rate limited; the total queue is also capped below the server's thread count (<code>SERVING_THREADS</code>) so a waiting backlog never blocks new connections; requests over quota get <code>429</code> with a <code>Retry-After</code> header. While queued, the stream sends <code>processing</code> events with a <code>queue_position</code> field.</p>
+            
             <h4>Response Format</h4>
             <p class="new">This endpoint uses Server-Sent Events (SSE) to provide real-time status updates during processing.</p>
             
+            <h3>GET /api/case-details/json</h3>
+            <p>Same lookup and query parameters, but without progress events: the response is the final result only.</p>
+            <ul>
+                <li>Carries a strong <code>ETag</code> computed from the extracted tables; send it back in <code>If-None-Match</code> to get <code>304 Not Modified</code> when nothing changed</li>
+                <li>Large responses are compressed with <code>br</code> or <code>gzip</code> according to <code>Accept-Encoding</code></li>
+                <li><code>Cache-Control: public, max-age=300</code> and <code>Vary: Accept-Encoding</code> let a reverse proxy cache responses</li>
+                <li>Lookup failures return <code>502</code> (or <code>404</code> when eCourts has no record)</li>
+            </ul>
+            <pre><code>curl --compressed -i http://localhost:5000/api/case-details/json?cnr_number=MHAU010012342022
+curl -i -H 'If-None-Match: "&lt;etag&gt;"' http://localhost:5000/api/case-details/json?cnr_number=MHAU010012342022</code></pre>
+            
             <h2>📊 Response Data Structure</h2>
             <p>The API returns the following case information:</p>
             <ul>
@@ -150,6 +259,32 @@ eventSource.onmessage = function(event) {
 }</code></pre>
             </div>
             
+            <h3>400 - Invalid CNR Number</h3>
+            <p>The CNR is checked locally (16 characters, known state code, plausible year) before any browser work:</p>
+            <div class="response-example">
+                <pre><code>{
+    "error": "Invalid CNR number: Unknown state code: XX",
+    "status": "failure"
+}</code></pre>
+            </div>
+            
+            <h3>404 - Record Not Found</h3>
+            <p>CNRs that eCourts recently reported as missing are answered from a local cache:</p>
+            <div class="response-example">
+                <pre><code>{
+    "error": "No record found for CNR MHAU010012342022",
+    "status": "failure"
+}</code></pre>
+            </div>
+            
+            <h3>429 - Over Quota</h3>
+            <div class="response-example">
+                <pre><code>{
+    "error": "Rate limit exceeded for this client",
+    "status": "failure"
+}</code></pre>
+            </div>
+            
             <h3>Processing Error</h3>
             <div class="response-example">
                 <pre><code>{
@@ -163,6 +298,14 @@ eventSource.onmessage = function(event) {
             <h3>GET /api/health</h3>
             <p>Check if the WebDriver is running properly:</p>
             <pre><code>curl http://localhost:5000/api/health</code></pre>
+            <p>The response includes scheduler load and browser watchdog gauges: Chrome/chromedriver RSS and CPU, process and tab counts, renderer crashes and recycles. The watchdog restarts the browser between lookups, never during one, when memory, sustained CPU or tab count cross their thresholds, or after a renderer crash.</p>
+            
+            <h2>⏱️ Profiling</h2>
+            <p>Send <code>X-Profile: 1</code> and the admin token with a case-details request to record a timeline of every WebDriver command, OCR call and parse step plus a sampling profile; it is attached to the final event (or the JSON response) as <code>profile</code>. Time spent queued for a browser session is shown as a separate <code>queue</code> span and is not counted in <code>duration_ms</code>. Without a valid token the header is ignored. Lookups slower than <code>SLOW_LOOKUP_SECONDS</code> (default 45) are kept in a bounded buffer:</p>
+            <p>The <code>/api/admin/*</code> endpoints require the <code>ADMIN_TOKEN</code> configured on the server, sent as <code>X-Admin-Token</code> or <code>Authorization: Bearer</code>; they are disabled when it is not set. API keys appear in reports only as a short hash.</p>
+            <pre><code>curl -H "X-Profile: 1" -H "X-Admin-Token: $ADMIN_TOKEN" -N http://localhost:5000/api/case-details?cnr_number=MHAU010012342022
+curl -H "X-Admin-Token: $ADMIN_TOKEN" http://localhost:5000/api/admin/slow-lookups
+curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" -H "Content-Type: application/json" -d '{"enabled": true}' http://localhost:5000/api/admin/profiling</code></pre>
             
             <h2>⚠️ Important Notes</h2>
             <ul>
@@ -171,7 +314,7 @@ eventSource.onmessage = function(event) {
                 <li class="new">Uses Server-Sent Events (SSE) for real-time progress updates</li>
                 <li>Processing may take 30-60 seconds depending on server response times</li>
                 <li>WebDriver is initialized once at startup for optimal performance</li>
-                <li>Each successful request automatically closes the browser tab to prevent memory leaks</li>
+                <li>Each request, successful or not, replaces its browser tab with a fresh one to prevent memory leaks</li>
                 <li>The system includes automatic retry logic for CAPTCHA failures</li>
                 <li>Maximum of 2 retry attempts per request</li>
             </ul>
@@ -191,26 +334,102 @@ docker run -p 5000:5000 cnr-details-api</code></pre>
     """
 
 
-@app.route('/api/case-details', methods=['GET'])
-def get_case_details_stream():
+def record_queue_wait(recorder, queued_at):
     """
-    API endpoint to fetch case details with live status updates using Server-Sent Events.
-    Query parameter: cnr_number (required)
-    Returns: SSE stream with status updates and final result
+    Add the wait for a browser session to a lookup's timeline as a 'queue'
+    span ending at the recorder's start, so duration_ms and the slow-lookup
+    threshold only cover the lookup itself.
+    """
+    if recorder is not None:
+        recorder.add('queue', 'wait_for_session', queued_at, recorder.start - queued_at)
+
+
+def admit_case_lookup():
+    """
+    Shared checks for the case-details endpoints: validate the CNR, reject
+    known-missing ones and take a scheduler ticket.
+    Returns (cnr_number, client_id, ticket, None) or (None, None, None, error_response).
     """
     cnr_number = request.args.get('cnr_number')
     
     if not cnr_number:
-        return jsonify({
+        return None, None, None, (jsonify({
             'error': 'CNR number is required',
             'status': 'failure'
-        }), 400
+        }), 400)
+
+    # Reject malformed and known-missing CNRs before touching the browser
+    try:
+        cnr_number = parse_cnr(cnr_number)['cnr_number']
+    except InvalidCNR as e:
+        return None, None, None, (jsonify({
+            'error': f'Invalid CNR number: {str(e)}',
+            'status': 'failure'
+        }), 400)
+
+    if is_known_not_found(cnr_number):
+        return None, None, None, (jsonify({
+            'error': f'No record found for CNR {cnr_number}',
+            'status': 'failure'
+        }), 404)
+
+    client_id = get_client_id()
+    try:
+        ticket = scheduler.submit(client_id)
+    except QuotaExceeded as e:
+        response = jsonify({
+            'error': str(e),
+            'status': 'failure'
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return None, None, None, (response, 429)
+
+    return cnr_number, client_id, ticket, None
+
+
+@app.route('/api/case-details', methods=['GET'])
+def get_case_details_stream():
+    """
+    API endpoint to fetch case details with live status updates using Server-Sent Events.
+    Query parameter: cnr_number (required)
+    Returns: SSE stream with status updates and final result
+    """
+    cnr_number, client_id, ticket, error_response = admit_case_lookup()
+    if error_response is not None:
+        return error_response
+
+    profile_requested = is_profile_requested()
     
     def generate_status_stream():
         """Generator function that yields status updates as SSE events."""
+        recorder = None
+        lookup_status = 'error'
         try:
+            # Wait for a browser session, reporting queue position as we go
+            queued_at = time.perf_counter()
+            last_position, last_sent = None, 0
+            while not scheduler.wait(ticket, timeout=1):
+                position = scheduler.position(ticket)
+                if position != last_position or time.time() - last_sent > 15:
+                    last_position, last_sent = position, time.time()
+                    queued_event = {
+                        'status': 'processing',
+                        'message': f'Waiting for an available browser session (position {position} in queue)...',
+                        'progress': 0,
+                        'queue_position': position
+                    }
+                    yield f"data: {json.dumps(queued_event)}\n\n"
+            recorder = start_lookup(cnr_number, client_id, profile_requested)
+            record_queue_wait(recorder, queued_at)
+
             # Call the enhanced function with status callback
             for status_update in solve_captcha_and_search_with_status(cnr_number):
+                if status_update['status'] in ('success', 'error'):
+                    # Close the timeline before the final event so it can carry the profile
+                    lookup_status = status_update['status']
+                    report = finish_lookup(recorder, lookup_status)
+                    if report is not None and report['profiled']:
+                        status_update = dict(status_update, profile=report)
                 # Format as Server-Sent Event
                 yield f"data: {json.dumps(status_update)}\n\n"
                 time.sleep(0.1)  # Small delay to ensure proper streaming
@@ -223,8 +442,10 @@ def get_case_details_stream():
                 'progress': 0
             }
             yield f"data: {json.dumps(error_event)}\n\n"
+        finally:
+            finish_lookup(recorder, lookup_status)
     
-    return Response(
+    response = Response(
         generate_status_stream(),
         mimetype='text/event-stream',
         headers={
@@ -234,32 +455,121 @@ def get_case_details_stream():
             'Access-Control-Allow-Headers': 'Cache-Control'
         }
     )
+    # Runs on completion, error and client disconnect alike, even if the
+    # stream was never started
+    response.call_on_close(lambda: scheduler.release(ticket))
+    return response
+
+@app.route('/api/case-details/json', methods=['GET'])
+def get_case_details_json():
+    """
+    Non-streaming variant of /api/case-details returning only the final result.
+    Query parameter: cnr_number (required)
+    Returns: JSON with a strong ETag; honours If-None-Match and gzip/br Accept-Encoding
+    """
+    cnr_number, client_id, ticket, error_response = admit_case_lookup()
+    if error_response is not None:
+        return error_response
+
+    profile_requested = is_profile_requested()
+    recorder = None
+    result = None
+    error_message = 'Failed to fetch case details'
+    try:
+        queued_at = time.perf_counter()
+        if not scheduler.wait(ticket, timeout=JSON_QUEUE_TIMEOUT):
+            response = jsonify({
+                'error': 'Timed out waiting for an available browser session',
+                'status': 'failure'
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 503
+
+        recorder = start_lookup(cnr_number, client_id, profile_requested)
+        record_queue_wait(recorder, queued_at)
+        try:
+            for status_update in solve_captcha_and_search_with_status(cnr_number):
+                if status_update['status'] == 'success':
+                    result = status_update['data']
+                elif status_update['status'] == 'error':
+                    error_message = status_update['message']
+        except Exception as e:
+            if result is None:
+                error_message = f'Failed to fetch case details: {str(e)}'
+    finally:
+        report = finish_lookup(recorder, 'success' if result is not None else 'error')
+        scheduler.release(ticket)
+
+    profile = report if report is not None and report['profiled'] else None
+
+    if result is None:
+        error_payload = {
+            'error': error_message,
+            'status': 'failure'
+        }
+        if profile is not None:
+            error_payload['profile'] = profile
+        status_code = 404 if is_known_not_found(cnr_number) else 502
+        return jsonify(error_payload), status_code
+
+    payload = {
+        'status': 'success',
+        'cnr_number': cnr_number,
+        'data': result
+    }
+    if profile is not None:
+        # A profile makes the body unique, so skip the shared ETag/caching path
+        response = jsonify(dict(payload, profile=profile))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    return conditional_json_response(request, payload, result)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """
     Health check endpoint to verify if the WebDriver is running.
+    The driver is only probed between lookups; while one is running the
+    browser is reported as busy instead of being touched mid-lookup.
     """
+    if not scheduler.pause(timeout=0):
+        return jsonify({
+            'status': 'healthy',
+            'webdriver_status': 'busy',
+            'scheduler': scheduler.stats(),
+            'watchdog': watchdog_gauges()
+        }), 200
     try:
         from webdriver import get_driver
         driver = get_driver()
         return jsonify({
             'status': 'healthy',
             'webdriver_status': 'running',
-            'current_url': driver.current_url
+            'current_url': driver.current_url,
+            'scheduler': scheduler.stats(),
+            'watchdog': watchdog_gauges()
         }), 200
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
             'webdriver_status': 'error',
-            'error': str(e)
+            'error': str(e),
+            'watchdog': watchdog_gauges()
         }), 503
+    finally:
+        scheduler.resume()
 
 @app.route('/api/restart-driver', methods=['POST'])
 def restart_driver_endpoint():
     """
     Endpoint to restart the WebDriver if it becomes unresponsive.
+    Waits for the running lookup to finish and holds new ones back, so the
+    browser is never restarted mid-lookup.
     """
+    if not scheduler.pause(timeout=RESTART_DRAIN_TIMEOUT):
+        return jsonify({
+            'status': 'failure',
+            'error': 'A lookup is still running; try again shortly'
+        }), 503
     try:
         from webdriver import restart_driver
         restart_driver()
@@ -272,6 +582,59 @@ def restart_driver_endpoint():
             'status': 'failure',
             'error': f'Failed to restart WebDriver: {str(e)}'
         }), 500
+    finally:
+        scheduler.resume()
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+@require_admin_token
+def profiling_endpoint():
+    """
+    Admin toggle for profiling every lookup.
+    POST body: {"enabled": true|false}
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        enabled = parse_bool(payload.get('enabled', True))
+        if enabled is None:
+            return jsonify({
+                'error': '"enabled" must be a boolean',
+                'status': 'failure'
+            }), 400
+        set_profiling_enabled(enabled)
+    return jsonify({
+        'status': 'success',
+        'profiling_enabled': is_profiling_enabled(),
+        'slow_lookup_seconds': SLOW_LOOKUP_SECONDS
+    }), 200
+
+@app.route('/api/admin/slow-lookups', methods=['GET'])
+@require_admin_token
+def slow_lookups_endpoint():
+    """
+    Flight recorder of slow and profiled lookups, newest first.
+    Query parameters: limit (optional), full=1 to include timelines and profiles
+    """
+    limit = request.args.get('limit', type=int)
+    full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+    return jsonify({
+        'status': 'success',
+        'lookups': recent_lookups(limit, summary_only=not full)
+    }), 200
+
+@app.route('/api/admin/slow-lookups/<lookup_id>', methods=['GET'])
+@require_admin_token
+def slow_lookup_endpoint(lookup_id):
+    """Full timeline and profile for one recorded lookup."""
+    report = get_lookup(lookup_id)
+    if report is None:
+        return jsonify({
+            'error': 'Lookup not found in flight recorder',
+            'status': 'failure'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'lookup': report
+    }), 200
 
 # Ensure cleanup happens when app shuts down
 def cleanup_on_exit():
@@ -0,0 +1,86 @@
+"""
+Benchmark per-attempt WebDriver overhead of the CNR search form.
+
+Compares the original element-by-element interaction against the scripted
+path in helpers.py. Both submit a deliberately wrong CAPTCHA, so OCR is left
+out. The scripted path waits until the search request has completed; the
+legacy path only waits for #validateError to be present, which can return
+before the response arrives, so its numbers are a lower bound.
+
+Usage: python benchmark_form.py [attempts]
+"""
+import sys
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from webdriver import initialize_driver, get_driver, quit_driver
+from helpers import prepare_search_form, capture_captcha, submit_search_form
+
+ECOURTS_URL = "https://services.ecourts.gov.in/ecourtindia_v6/"
+SAMPLE_CNR = "MHAU010012342022"
+WRONG_CAPTCHA = "zzzzzz"
+
+def legacy_attempt(driver):
+    """The pre-scripted attempt: one WebDriver call per element operation."""
+    time.sleep(2)  # Ensure page is loaded
+    cnr_input = driver.find_element(By.ID, "cino")
+    cnr_input.clear()
+    cnr_input.send_keys(SAMPLE_CNR)
+    driver.find_element(By.ID, "captcha_image").screenshot_as_png
+    captcha_input = driver.find_element(By.ID, "fcaptcha_code")
+    captcha_input.clear()
+    captcha_input.send_keys(WRONG_CAPTCHA)
+    driver.find_element(By.ID, "searchbtn").click()
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "validateError"))
+    )
+    return driver.find_element(By.ID, "validateError").get_attribute("style")
+
+def scripted_attempt(driver):
+    """The current attempt: two scripts and one CDP screenshot, including the server wait."""
+    clip = prepare_search_form(driver, SAMPLE_CNR)
+    capture_captcha(driver, clip)
+    return submit_search_form(driver, WRONG_CAPTCHA)
+
+def count_commands(driver):
+    """Wrap driver.execute so every chromedriver round-trip is counted."""
+    counter = {'commands': 0}
+    original_execute = driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter['commands'] += 1
+        return original_execute(*args, **kwargs)
+
+    driver.execute = counting_execute
+    return counter
+
+def run(attempt, driver, counter, attempts):
+    timings = []
+    commands = 0
+    for _ in range(attempts):
+        driver.get(ECOURTS_URL)
+        counter['commands'] = 0
+        start = time.perf_counter()
+        attempt(driver)
+        timings.append(time.perf_counter() - start)
+        commands += counter['commands']
+    timings.sort()
+    return {
+        'mean_ms': 1000 * sum(timings) / len(timings),
+        'median_ms': 1000 * timings[len(timings) // 2],
+        'commands_per_attempt': commands / attempts,
+    }
+
+if __name__ == '__main__':
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    initialize_driver()
+    try:
+        driver = get_driver()
+        counter = count_commands(driver)
+        for name, attempt in (('legacy', legacy_attempt), ('scripted', scripted_attempt)):
+            result = run(attempt, driver, counter, attempts)
+            print(f"{name:>8}: mean {result['mean_ms']:.0f} ms, median {result['median_ms']:.0f} ms, "
+                  f"{result['commands_per_attempt']:.1f} WebDriver commands per attempt")
+    finally:
+        quit_driver()
@@ -0,0 +1,200 @@
+"""
+Background watchdog for the shared Chrome instance.
+
+Every WATCHDOG_INTERVAL seconds it samples RSS and CPU of the chromedriver
+and Chrome process tree (via psutil, when installed) and, while no lookup is
+running, the open tab count and browser liveness. When a threshold is
+crossed or a renderer crash was reported, it pauses the scheduler, waits for
+the running lookup to finish, restarts the browser and resumes, so a browser
+is never recycled during a lookup. /api/health and /api/restart-driver take
+the same scheduler pause before touching the driver.
+"""
+import os
+import time
+import threading
+
+try:
+    import psutil
+except ImportError:  # process gauges are reported as None without psutil
+    psutil = None
+
+from scheduler import scheduler
+from webdriver import peek_driver, get_driver_pid, restart_driver
+
+WATCHDOG_INTERVAL = float(os.environ.get('WATCHDOG_INTERVAL', 15))
+WATCHDOG_MAX_RSS_MB = float(os.environ.get('WATCHDOG_MAX_RSS_MB', 1500))
+WATCHDOG_MAX_CPU_PERCENT = float(os.environ.get('WATCHDOG_MAX_CPU_PERCENT', 90))
+WATCHDOG_CPU_CHECKS = int(os.environ.get('WATCHDOG_CPU_CHECKS', 4))
+WATCHDOG_MAX_TABS = int(os.environ.get('WATCHDOG_MAX_TABS', 3))
+WATCHDOG_DRAIN_TIMEOUT = float(os.environ.get('WATCHDOG_DRAIN_TIMEOUT', 120))
+
+_lock = threading.Lock()
+_thread = None
+_thread_pid = None
+_processes = {}
+_gauges = {
+    'rss_mb': None,
+    'cpu_percent': None,
+    'process_count': None,
+    'tab_count': None,
+    'renderer_crashes': 0,
+    'recycles': 0,
+    'last_recycle_at': None,
+    'last_recycle_reason': None,
+    'last_check_at': None,
+}
+_pending_crashes = 0
+_cpu_over_count = 0
+
+
+def note_renderer_crash():
+    """Called from the lookup path when Chrome reports a crashed tab."""
+    global _pending_crashes
+    with _lock:
+        _gauges['renderer_crashes'] += 1
+        _pending_crashes += 1
+
+
+def gauges():
+    """Latest watchdog readings for the health endpoint."""
+    with _lock:
+        return dict(_gauges, running=_thread is not None and _thread.is_alive())
+
+
+def _sample_process_tree():
+    """Return (rss_mb, cpu_percent, process_count) for chromedriver and its children."""
+    pid = get_driver_pid()
+    if psutil is None or pid is None:
+        return None, None, None
+    try:
+        root = psutil.Process(pid)
+        tree = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return None, None, None
+
+    rss = 0
+    cpu = 0.0
+    seen = set()
+    for process in tree:
+        seen.add(process.pid)
+        try:
+            # Reuse Process objects so cpu_percent measures since the last check
+            cached = _processes.get(process.pid)
+            if cached is None or cached.create_time() != process.create_time():
+                cached = _processes[process.pid] = process
+            rss += cached.memory_info().rss
+            cpu += cached.cpu_percent(None)
+        except psutil.Error:
+            continue
+    for stale_pid in set(_processes) - seen:
+        del _processes[stale_pid]
+    return round(rss / (1024 * 1024), 1), round(cpu, 1), len(tree)
+
+
+def _probe_tabs(driver):
+    """Count open tabs; returns None if the browser did not answer."""
+    try:
+        return len(driver.window_handles)
+    except Exception as e:
+        if "tab crashed" in str(e).lower():
+            note_renderer_crash()
+        return None
+
+
+def _threshold_reason(rss_mb, cpu_percent):
+    """Check resource gauges; CPU must stay high for several checks in a row."""
+    global _cpu_over_count
+    if cpu_percent is not None and cpu_percent > WATCHDOG_MAX_CPU_PERCENT:
+        _cpu_over_count += 1
+    else:
+        _cpu_over_count = 0
+
+    if rss_mb is not None and rss_mb > WATCHDOG_MAX_RSS_MB:
+        return f'RSS {rss_mb} MB over {WATCHDOG_MAX_RSS_MB} MB'
+    if _cpu_over_count >= WATCHDOG_CPU_CHECKS:
+        return f'CPU over {WATCHDOG_MAX_CPU_PERCENT}% for {_cpu_over_count} checks'
+    return None
+
+
+def _crash_reason():
+    with _lock:
+        if _pending_crashes:
+            return f'{_pending_crashes} renderer crash(es)'
+    return None
+
+
+def _recycle(reason):
+    """Restart the browser between lookups."""
+    global _pending_crashes, _cpu_over_count
+    print(f"Watchdog recycling browser: {reason}")
+    try:
+        restart_driver()
+    except Exception as e:
+        print(f"Watchdog failed to restart WebDriver: {str(e)}")
+        return
+    with _lock:
+        _pending_crashes = 0
+        _cpu_over_count = 0
+        _gauges['recycles'] += 1
+        _gauges['last_recycle_at'] = time.time()
+        _gauges['last_recycle_reason'] = reason
+    _processes.clear()
+
+
+def check_once():
+    """One watchdog pass: sample gauges and recycle the browser if needed."""
+    if peek_driver() is None:
+        return
+
+    rss_mb, cpu_percent, process_count = _sample_process_tree()
+    with _lock:
+        _gauges.update(
+            rss_mb=rss_mb,
+            cpu_percent=cpu_percent,
+            process_count=process_count,
+            last_check_at=time.time()
+        )
+
+    reason = _threshold_reason(rss_mb, cpu_percent) or _crash_reason()
+    drain_timeout = WATCHDOG_DRAIN_TIMEOUT if reason else 0
+
+    # WebDriver is only touched while no lookup holds the browser
+    if not scheduler.pause(timeout=drain_timeout):
+        return
+    try:
+        driver = peek_driver()
+        tab_count = _probe_tabs(driver) if driver is not None else None
+        with _lock:
+            _gauges['tab_count'] = tab_count
+        if reason is None:
+            if tab_count is None:
+                reason = 'browser not responding'
+            elif tab_count > WATCHDOG_MAX_TABS:
+                reason = f'{tab_count} open tabs over {WATCHDOG_MAX_TABS}'
+            else:
+                reason = _crash_reason()
+        if reason is not None:
+            _recycle(reason)
+    finally:
+        scheduler.resume()
+
+
+def _watchdog_loop():
+    while True:
+        time.sleep(WATCHDOG_INTERVAL)
+        try:
+            check_once()
+        except Exception as e:
+            print(f"Watchdog check failed: {str(e)}")
+
+
+def ensure_watchdog():
+    """Start the watchdog thread in this process (threads do not survive a fork)."""
+    global _thread, _thread_pid
+    if _thread is not None and _thread_pid == os.getpid() and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is None or _thread_pid != os.getpid() or not _thread.is_alive():
+            _thread = threading.Thread(target=_watchdog_loop, name='browser-watchdog', daemon=True)
+            _thread_pid = os.getpid()
+            _thread.start()
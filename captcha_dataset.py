@@ -0,0 +1,251 @@
+"""
+CAPTCHA training data captured from live lookups.
+
+Every attempt's CAPTCHA PNG, OCR candidate and validation outcome is queued
+and written by a background thread, so the request path only pays for a
+queue put. On disk the dataset is sharded by the first two hex digits of the
+image's SHA-256:
+
+    images/<shard>/<sha256>.png   one file per distinct image
+    labels/<shard>.jsonl          append-only {"hash", "text", "outcome", "ts"}
+
+Outcomes are "correct" (eCourts accepted the text), "incorrect" (rejected)
+and "unreadable" (OCR produced too little text to submit).
+
+Capture is off unless CAPTCHA_CAPTURE=1. Once the dataset reaches
+CAPTCHA_DATASET_MAX_MB, new samples are dropped until space is freed (for
+example by exporting and clearing the directory).
+
+Command line:
+    python captcha_dataset.py stats
+    python captcha_dataset.py export OUT_DIR
+    python captcha_dataset.py replay [--solver module:function] [--limit N]
+"""
+import os
+import csv
+import sys
+import json
+import time
+import queue
+import shutil
+import hashlib
+import argparse
+import importlib
+import threading
+
+CAPTCHA_DATASET_DIR = os.environ.get('CAPTCHA_DATASET_DIR', '/tmp/captcha-dataset')
+CAPTCHA_CAPTURE = os.environ.get('CAPTCHA_CAPTURE', '0').lower() in ('1', 'true', 'yes')
+CAPTCHA_DATASET_MAX_MB = float(os.environ.get('CAPTCHA_DATASET_MAX_MB', 500))
+
+OUTCOMES = ('correct', 'incorrect', 'unreadable')
+
+_queue = queue.Queue(maxsize=1000)
+_writer = None
+_writer_lock = threading.Lock()
+_seen = set()
+_dataset_bytes = {}
+
+
+def record_attempt(image_bytes, candidate, outcome):
+    """Queue one CAPTCHA attempt for writing. Never blocks the caller."""
+    if not CAPTCHA_CAPTURE or not image_bytes:
+        return
+    _ensure_writer()
+    try:
+        _queue.put_nowait((image_bytes, candidate or '', outcome, time.time()))
+    except queue.Full:
+        print("CAPTCHA dataset queue full, dropping sample")
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_writer_loop, name='captcha-dataset', daemon=True)
+                _writer.start()
+
+
+def _writer_loop():
+    while True:
+        image_bytes, candidate, outcome, ts = _queue.get()
+        try:
+            write_sample(image_bytes, candidate, outcome, ts)
+        except Exception as e:
+            print(f"Error writing CAPTCHA sample: {str(e)}")
+
+
+def dataset_size(directory):
+    """Bytes used by the dataset, measured once per process and then tracked."""
+    if directory not in _dataset_bytes:
+        total = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+        _dataset_bytes[directory] = total
+    return _dataset_bytes[directory]
+
+
+def write_sample(image_bytes, candidate, outcome, ts=None, directory=None):
+    """
+    Store the image once per hash and append a label line to its shard.
+    Returns the image hash, or None if the dataset is at its size limit.
+    """
+    directory = directory or CAPTCHA_DATASET_DIR
+    if dataset_size(directory) >= CAPTCHA_DATASET_MAX_MB * 1024 * 1024:
+        return None
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    shard = digest[:2]
+
+    key = (digest, candidate, outcome)
+    if key in _seen:
+        return digest
+    if len(_seen) > 100000:
+        _seen.clear()
+    _seen.add(key)
+
+    image_dir = os.path.join(directory, 'images', shard)
+    image_path = os.path.join(image_dir, f'{digest}.png')
+    if not os.path.exists(image_path):
+        os.makedirs(image_dir, exist_ok=True)
+        tmp_path = f'{image_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, image_path)
+        _dataset_bytes[directory] += len(image_bytes)
+
+    label_dir = os.path.join(directory, 'labels')
+    os.makedirs(label_dir, exist_ok=True)
+    record = {'hash': digest, 'text': candidate, 'outcome': outcome, 'ts': round(ts or time.time(), 3)}
+    line = json.dumps(record) + '\n'
+    with open(os.path.join(label_dir, f'{shard}.jsonl'), 'a', encoding='utf-8') as f:
+        f.write(line)
+    _dataset_bytes[directory] += len(line.encode('utf-8'))
+    return digest
+
+
+def iter_records(directory=None):
+    """Yield every label record across all shards."""
+    label_dir = os.path.join(directory or CAPTCHA_DATASET_DIR, 'labels')
+    if not os.path.isdir(label_dir):
+        return
+    for name in sorted(os.listdir(label_dir)):
+        if not name.endswith('.jsonl'):
+            continue
+        with open(os.path.join(label_dir, name), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def load_labels(directory=None):
+    """
+    Merge records per image: {hash: {'label': accepted text or None,
+    'rejected': set of texts eCourts rejected}}.
+    """
+    labels = {}
+    for record in iter_records(directory):
+        entry = labels.setdefault(record['hash'], {'label': None, 'rejected': set()})
+        if record['outcome'] == 'correct':
+            entry['label'] = record['text']
+        elif record['outcome'] == 'incorrect':
+            entry['rejected'].add(record['text'])
+    return labels
+
+
+def image_path(digest, directory=None):
+    return os.path.join(directory or CAPTCHA_DATASET_DIR, 'images', digest[:2], f'{digest}.png')
+
+
+def stats(directory=None):
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    for record in iter_records(directory):
+        counts[record['outcome']] = counts.get(record['outcome'], 0) + 1
+    labels = load_labels(directory)
+    attempts = counts['correct'] + counts['incorrect'] + counts['unreadable']
+    return {
+        'attempts': attempts,
+        'outcomes': counts,
+        'images': len(labels),
+        'labelled_images': sum(1 for entry in labels.values() if entry['label']),
+        'live_accuracy': counts['correct'] / attempts if attempts else None,
+    }
+
+
+def export(out_dir, directory=None):
+    """Copy ground-truth labelled images to out_dir with a labels.csv index."""
+    os.makedirs(out_dir, exist_ok=True)
+    exported = 0
+    with open(os.path.join(out_dir, 'labels.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['filename', 'label', 'hash'])
+        for digest, entry in sorted(load_labels(directory).items()):
+            source = image_path(digest, directory)
+            if not entry['label'] or not os.path.exists(source):
+                continue
+            filename = f"{entry['label']}_{digest[:12]}.png"
+            shutil.copyfile(source, os.path.join(out_dir, filename))
+            writer.writerow([filename, entry['label'], digest])
+            exported += 1
+    return exported
+
+
+def load_solver(spec):
+    """Resolve "module:function"; the function takes PNG bytes and returns text."""
+    module_name, _, function_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), function_name or 'solve')
+
+
+def replay(solver, directory=None, limit=None):
+    """
+    Run solver over stored images. Accuracy is measured against accepted
+    labels; images with only rejected guesses still count solver answers
+    that repeat a known-wrong guess.
+    """
+    result = {'labelled': 0, 'correct': 0, 'unlabelled': 0, 'known_wrong': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+    for n, (digest, entry) in enumerate(sorted(load_labels(directory).items())):
+        if limit is not None and n >= limit:
+            break
+        path = image_path(digest, directory)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            answer = solver(f.read())
+        if entry['label']:
+            result['labelled'] += 1
+            result['correct'] += answer == entry['label']
+        else:
+            result['unlabelled'] += 1
+            result['known_wrong'] += answer in entry['rejected']
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['accuracy'] = result['correct'] / result['labelled'] if result['labelled'] else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='CAPTCHA dataset tooling')
+    parser.add_argument('--dir', default=CAPTCHA_DATASET_DIR, help='dataset directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='summarise captured attempts')
+    export_parser = commands.add_parser('export', help='export ground-truth labelled images')
+    export_parser.add_argument('out_dir')
+    replay_parser = commands.add_parser('replay', help='replay stored images against a solver')
+    replay_parser.add_argument('--solver', default='helpers:read_captcha', help='module:function taking PNG bytes')
+    replay_parser.add_argument('--limit', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        print(json.dumps(stats(args.dir), indent=2))
+    elif args.command == 'export':
+        print(f"Exported {export(args.out_dir, args.dir)} labelled images to {args.out_dir}")
+    elif args.command == 'replay':
+        print(json.dumps(replay(load_solver(args.solver), args.dir, args.limit), indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
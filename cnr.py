@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# A CNR is 16 characters: state (2 letters), district (2 letters),
+# establishment (2 digits), case serial (6 digits) and filing year (4 digits).
+# e.g. MH AU 01 001234 2022
+CNR_PATTERN = re.compile(r'^([A-Z]{2})([A-Z]{2})(\d{2})(\d{6})(\d{4})$')
+
+COURT_CODES_PATH = os.environ.get(
+    'COURT_CODES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'court_codes.json')
+)
+
+NOT_FOUND_TTL_SECONDS = int(os.environ.get('CNR_NOT_FOUND_TTL', 24 * 60 * 60))
+NOT_FOUND_CACHE_SIZE = int(os.environ.get('CNR_NOT_FOUND_CACHE_SIZE', 10000))
+
+_court_index = None
+_not_found = OrderedDict()
+_not_found_lock = threading.Lock()
+
+
+class InvalidCNR(ValueError):
+    """Raised when a CNR number fails local validation."""
+
+
+def load_court_index(path=None):
+    """Load the bundled state/district/establishment index (cached after first load)."""
+    global _court_index
+    if _court_index is None or path is not None:
+        with open(path or COURT_CODES_PATH, encoding='utf-8') as f:
+            _court_index = json.load(f)['states']
+    return _court_index
+
+
+def normalize_cnr(cnr_number):
+    """Uppercase the CNR and drop the spaces/hyphens people paste in."""
+    return re.sub(r'[\s\-]', '', cnr_number or '').upper()
+
+
+def parse_cnr(cnr_number):
+    """
+    Validate a CNR against its 16-character structure and the court index.
+    Returns a dict with the decoded components, raises InvalidCNR otherwise.
+    """
+    cnr = normalize_cnr(cnr_number)
+    if len(cnr) != 16:
+        raise InvalidCNR(f'CNR number must be 16 characters, got {len(cnr)}')
+
+    match = CNR_PATTERN.match(cnr)
+    if not match:
+        raise InvalidCNR('CNR number must be 4 letters followed by 12 digits')
+
+    state, district, establishment, serial, year = match.groups()
+
+    states = load_court_index()
+    state_info = states.get(state)
+    if state_info is None:
+        raise InvalidCNR(f'Unknown state code: {state}')
+
+    # Unknown district/establishment codes are only rejected where the index
+    # entry is marked "complete"; partial lists still decode names for the
+    # codes they know without turning away CNRs they don't.
+    districts = state_info.get('districts') or {}
+    district_info = districts.get(district)
+    if district_info is None and state_info.get('complete'):
+        raise InvalidCNR(f'Unknown district code for {state}: {district}')
+
+    establishments = (district_info or {}).get('establishments') or {}
+    if establishment not in establishments and (district_info or {}).get('complete'):
+        raise InvalidCNR(f'Unknown establishment code for {state}{district}: {establishment}')
+
+    if int(serial) == 0:
+        raise InvalidCNR('Case serial number cannot be zero')
+
+    if not 1950 <= int(year) <= time.localtime().tm_year:
+        raise InvalidCNR(f'Invalid filing year: {year}')
+
+    return {
+        'cnr_number': cnr,
+        'state_code': state,
+        'state': state_info.get('name'),
+        'district_code': district,
+        'district': (district_info or {}).get('name'),
+        'establishment_code': establishment,
+        'establishment': establishments.get(establishment),
+        'court_indexed': district_info is not None and establishment in establishments,
+        'serial': serial,
+        'year': year,
+    }
+
+
+def mark_not_found(cnr_number):
+    """Remember that eCourts returned no record for this CNR."""
+    cnr = normalize_cnr(cnr_number)
+    with _not_found_lock:
+        _not_found[cnr] = time.time() + NOT_FOUND_TTL_SECONDS
+        _not_found.move_to_end(cnr)
+        while len(_not_found) > NOT_FOUND_CACHE_SIZE:
+            _not_found.popitem(last=False)
+
+
+def is_known_not_found(cnr_number):
+    """Check the negative cache; expired entries are dropped on lookup."""
+    cnr = normalize_cnr(cnr_number)
+    with _not_found_lock:
+        expires_at = _not_found.get(cnr)
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            del _not_found[cnr]
+            return False
+        return True
+
+
+def clear_not_found():
+    """Drop every cached "record not found" entry."""
+    with _not_found_lock:
+        _not_found.clear()
@@ -1,19 +1,153 @@
 import time
 import re
+import base64
 import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver import get_driver, restart_driver
+from profiling import traced
 
-def read_captcha(driver):
-    time.sleep(2)  # Ensure page is loaded
-    
-    captcha_element = driver.find_element(By.ID, "captcha_image")
-    
-    # Get the CAPTCHA image as PNG bytes
-    image_bytes = captcha_element.screenshot_as_png
-    
+# Each attempt talks to chromedriver through three calls: one script that waits
+# for the CAPTCHA image and fills in the CNR, one CDP screenshot of the image,
+# and one script that submits the form and waits for the search response.
+
+# Waits for the CAPTCHA image to load, fills in the CNR and returns the image's
+# page coordinates for the screenshot clip.
+PREPARE_FORM_SCRIPT = """
+var cnr = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var start = Date.now();
+function setValue(el, value) {
+    el.value = value;
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+(function poll() {
+    var cnrInput = document.getElementById('cino');
+    var image = document.getElementById('captcha_image');
+    if (!cnrInput || !image || !image.complete || image.naturalWidth === 0) {
+        if (Date.now() - start > timeoutMs) {
+            done({error: !cnrInput ? 'CNR input not found' : 'CAPTCHA image did not load'});
+        } else {
+            setTimeout(poll, 100);
+        }
+        return;
+    }
+    setValue(cnrInput, cnr);
+    var captchaInput = document.getElementById('fcaptcha_code');
+    if (captchaInput) { setValue(captchaInput, ''); }
+    image.scrollIntoView({block: 'center'});
+    var rect = image.getBoundingClientRect();
+    done({
+        x: rect.left + window.scrollX,
+        y: rect.top + window.scrollY,
+        width: rect.width,
+        height: rect.height
+    });
+})();
+"""
+
+# Fills in the CAPTCHA, clicks search and resolves once the outcome is known.
+# The state of #validateError and the results container is recorded before the
+# click, and XMLHttpRequest.send is counted (eCourts submits through jQuery
+# AJAX). The script resolves after the search request has completed, or, if
+# the page never sent one, after the error/result state changed. Either way
+# it waits a short settle period so the response handlers have rendered.
+SUBMIT_FORM_SCRIPT = """
+var captcha = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var settleMs = 250;
+var captchaInput = document.getElementById('fcaptcha_code');
+var searchButton = document.getElementById('searchbtn');
+if (!captchaInput || !searchButton) {
+    done({error: !captchaInput ? 'CAPTCHA input not found' : 'Search button not found'});
+    return;
+}
+if (!window.__cnrXhr) {
+    window.__cnrXhr = {started: 0, finished: 0};
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        window.__cnrXhr.started++;
+        this.addEventListener('loadend', function() { window.__cnrXhr.finished++; });
+        return originalSend.apply(this, arguments);
+    };
+}
+function snapshot() {
+    var error = document.getElementById('validateError');
+    var shown = !!error && error.getClientRects().length > 0 &&
+        window.getComputedStyle(error).visibility !== 'hidden';
+    return {
+        shown: shown,
+        style: error ? (error.getAttribute('style') || '') : null,
+        message: shown ? (error.innerText || '').trim() : '',
+        results: !!document.querySelector('.case_details_table, #history_cnr table')
+    };
+}
+var before = snapshot();
+var xhrBefore = window.__cnrXhr.started;
+
+captchaInput.value = captcha;
+captchaInput.dispatchEvent(new Event('input', {bubbles: true}));
+captchaInput.dispatchEvent(new Event('change', {bubbles: true}));
+searchButton.click();
+
+var start = Date.now(), settledSince = null;
+(function poll() {
+    var xhr = window.__cnrXhr, now = snapshot();
+    var requestSent = xhr.started > xhrBefore;
+    var requestDone = requestSent && xhr.finished >= xhr.started;
+    var changed = now.shown !== before.shown || now.style !== before.style ||
+        now.message !== before.message || now.results !== before.results;
+    if (requestDone || (!requestSent && changed)) {
+        settledSince = settledSince || Date.now();
+        if (Date.now() - settledSince >= settleMs) {
+            done({accepted: !now.shown, message: now.message, results: now.results});
+            return;
+        }
+    } else {
+        settledSince = null;
+    }
+    if (Date.now() - start > timeoutMs) {
+        done({error: 'Timed out waiting for the search response'});
+        return;
+    }
+    setTimeout(poll, 50);
+})();
+"""
+
+def prepare_search_form(driver, cnr_number, timeout=10):
+    """Fill in the CNR and return the CAPTCHA image clip, in one round-trip."""
+    result = driver.execute_async_script(PREPARE_FORM_SCRIPT, cnr_number, timeout * 1000)
+    if not result or 'error' in result:
+        raise Exception((result or {}).get('error', 'Search form not found'))
+    return result
+
+def capture_captcha(driver, clip):
+    """Screenshot just the CAPTCHA image through a single CDP call."""
+    screenshot = driver.execute_cdp_cmd('Page.captureScreenshot', {
+        'format': 'png',
+        'captureBeyondViewport': True,
+        'clip': {
+            'x': clip['x'],
+            'y': clip['y'],
+            'width': clip['width'],
+            'height': clip['height'],
+            'scale': 1
+        }
+    })
+    return base64.b64decode(screenshot['data'])
+
+def submit_search_form(driver, captcha_text, timeout=10):
+    """
+    Submit the CAPTCHA and wait for the search response, in one round-trip.
+    Returns {'accepted': bool, 'message': visible #validateError text, 'results': bool}.
+    """
+    result = driver.execute_async_script(SUBMIT_FORM_SCRIPT, captcha_text, timeout * 1000)
+    if not result or 'error' in result:
+        raise Exception((result or {}).get('error', 'No validation response'))
+    return result
+
+@traced('ocr')
+def read_captcha(image_bytes):
     # Send the image bytes directly to OCR.Space API
     response = requests.post(
         'https://api.ocr.space/parse/image',
@@ -35,15 +169,70 @@ import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver import get_driver, restart_driver
+from webdriver import get_driver, restart_driver, reset_tabs
+from browser_watchdog import note_renderer_crash
+from cnr import mark_not_found
+from captcha_dataset import record_attempt
 import os
 from datetime import datetime
 
+# Messages eCourts shows in place of the case tables when a CNR has no record
+NOT_FOUND_MARKERS = (
+    'this case code does not exist',
+    'record not found',
+    'invalid cnr',
+)
+
+# Containers eCourts renders search errors and results into; text anywhere
+# else on the page (scripts, hidden templates) is ignored
+RESULT_CONTAINER_IDS = ('validateError', 'history_cnr')
+
+HIDDEN_STYLE_PATTERN = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.I)
+HIDDEN_CLASSES = {'d-none', 'hidden', 'hide'}
+
+def is_element_hidden(element):
+    """Check an element and its ancestors for inline/class-based hiding."""
+    while element is not None and element.name not in (None, '[document]'):
+        if element.has_attr('hidden') or HIDDEN_STYLE_PATTERN.search(element.get('style', '')):
+            return True
+        if HIDDEN_CLASSES & set(element.get('class', [])):
+            return True
+        element = element.parent
+    return False
+
+def visible_text(element):
+    """Text of an element, skipping hidden descendants, scripts and styles."""
+    parts = []
+    for text_node in element.find_all(string=True):
+        parent = text_node.parent
+        if parent.name in ('script', 'style', 'template') or is_element_hidden(parent):
+            continue
+        parts.append(text_node.strip())
+    return ' '.join(part for part in parts if part)
+
+def is_not_found_message(message):
+    """Check an eCourts error message for a "no such record" marker."""
+    message = (message or '').lower()
+    return any(marker in message for marker in NOT_FOUND_MARKERS)
+
+@traced('parse')
+def is_record_not_found(html_content):
+    """Check whether a visible result/error container reports that the CNR has no record."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for container_id in RESULT_CONTAINER_IDS:
+        container = soup.find(id=container_id)
+        if container is None or is_element_hidden(container):
+            continue
+        if is_not_found_message(visible_text(container)):
+            return True
+    return False
+
 def solve_captcha_and_search_with_status(cnr_number):
     """Enhanced function that yields status updates during processing"""
     driver = get_driver()
     max_retries = 2
     retry_count = 0
+    record_missing = False
     
     try:
         # Initial status
@@ -78,10 +267,8 @@ def solve_captcha_and_search_with_status(cnr_number):
                     'progress': 20 + (retry_count * 5)
                 }
                 
-                # Clear and enter CNR number
-                cnr_input = driver.find_element(By.ID, "cino")
-                cnr_input.clear()
-                cnr_input.send_keys(cnr_number)
+                # Enter CNR number and locate the CAPTCHA in one round-trip
+                captcha_clip = prepare_search_form(driver, cnr_number)
 
                 yield {
                     'status': 'processing',
@@ -90,8 +277,10 @@ def solve_captcha_and_search_with_status(cnr_number):
                 }
 
                 # Read and enter CAPTCHA
-                captcha_text = read_captcha(driver)
+                captcha_image = capture_captcha(driver, captcha_clip)
+                captcha_text = read_captcha(captcha_image)
                 if not captcha_text or len(captcha_text.strip()) < 4:
+                    record_attempt(captcha_image, captcha_text, 'unreadable')
                     yield {
                         'status': 'processing',
                         'message': f'CAPTCHA reading failed, retrying... (attempt {retry_count + 1}/{max_retries})',
@@ -107,26 +296,21 @@ def solve_captcha_and_search_with_status(cnr_number):
                     'progress': 35 + (retry_count * 5)
                 }
 
-                captcha_input = driver.find_element(By.ID, "fcaptcha_code")
-                captcha_input.clear()
-                captcha_input.send_keys(captcha_text)
-                
-                # Click search button
-                driver.find_element(By.ID, "searchbtn").click()
-
                 yield {
                     'status': 'processing',
                     'message': 'Waiting for server response...',
                     'progress': 40 + (retry_count * 5)
                 }
 
-                # Wait for validation response
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "validateError"))
-                )
-                
-                error_style = driver.find_element(By.ID, "validateError").get_attribute("style")
-                if "display: none" in error_style:
+                # Fill in CAPTCHA, submit and wait for the search response
+                search_outcome = submit_search_form(driver, captcha_text)
+                if not search_outcome['accepted'] and is_not_found_message(search_outcome['message']):
+                    # eCourts answered the search but has no record; retrying won't help
+                    record_missing = True
+                    break
+                captcha_accepted = search_outcome['accepted']
+                record_attempt(captcha_image, captcha_text, 'correct' if captcha_accepted else 'incorrect')
+                if captcha_accepted:
                     # CAPTCHA verified successfully
                     yield {
                         'status': 'processing',
@@ -184,6 +368,11 @@ def solve_captcha_and_search_with_status(cnr_number):
             }
             raise Exception("Max retries exceeded for CAPTCHA solving")
 
+        if record_missing or is_record_not_found(driver.page_source):
+            # Cache the miss so repeat lookups are rejected without a browser
+            mark_not_found(cnr_number)
+            raise Exception(f"No record found for CNR {cnr_number}")
+
         # Extract all case information with status updates
         yield {
             'status': 'processing',
@@ -259,16 +448,8 @@ def solve_captcha_and_search_with_status(cnr_number):
         }
         
         try:
-            # Close current tab
-            driver.close()
-            
-            # If there are other tabs, switch to the last one
-            if len(driver.window_handles) > 0:
-                driver.switch_to.window(driver.window_handles[-1])
-            else:
-                # If no tabs left, create a new blank tab
-                driver.execute_script("window.open('', '_blank');")
-                driver.switch_to.window(driver.window_handles[-1])
+            # Replace the used tab with a fresh one, closing any strays
+            reset_tabs(driver)
         except Exception as e:
             print(f"Error closing tab: {str(e)}")
             # Continue anyway as data extraction was successful
@@ -283,14 +464,12 @@ def solve_captcha_and_search_with_status(cnr_number):
     except Exception as e:
         print(f"Error in solve_captcha_and_search_with_status: {str(e)}")
         
+        if "tab crashed" in str(e).lower():
+            note_renderer_crash()
+
         # Try to close tab even on error
         try:
-            driver.close()
-            if len(driver.window_handles) > 0:
-                driver.switch_to.window(driver.window_handles[-1])
-            else:
-                driver.execute_script("window.open('', '_blank');")
-                driver.switch_to.window(driver.window_handles[-1])
+            reset_tabs(driver)
         except:
             pass
         
@@ -326,6 +505,7 @@ from datetime import datetime
 import os
 
 # 🧩 TABLE PARSERS
+@traced('parse')
 def extract_case_details_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -343,6 +523,7 @@ def extract_case_details_table(html_content):
         print(f"Error extracting case details: {str(e)}")
         return []
 
+@traced('parse')
 def extract_case_status_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -360,6 +541,7 @@ def extract_case_status_table(html_content):
         print(f"Error extracting case status: {str(e)}")
         return []
 
+@traced('parse')
 def extract_petitioner_advocate_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -377,6 +559,7 @@ def extract_petitioner_advocate_table(html_content):
         print(f"Error extracting petitioner advocate: {str(e)}")
         return []
 
+@traced('parse')
 def extract_respondent_advocate_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -394,6 +577,7 @@ def extract_respondent_advocate_table(html_content):
         print(f"Error extracting respondent advocate: {str(e)}")
         return []
 
+@traced('parse')
 def extract_acts_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -411,6 +595,7 @@ def extract_acts_table(html_content):
         print(f"Error extracting acts: {str(e)}")
         return []
 
+@traced('parse')
 def extract_history_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -428,6 +613,7 @@ def extract_history_table(html_content):
         print(f"Error extracting history: {str(e)}")
         return []
 
+@traced('parse')
 def extract_order_table(html_content):
     try:
         soup = BeautifulSoup(html_content, 'html.parser')
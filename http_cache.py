@@ -0,0 +1,67 @@
+import os
+import gzip
+import json
+import hashlib
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+CASE_DETAILS_MAX_AGE = int(os.environ.get('CASE_DETAILS_MAX_AGE', 300))
+MIN_COMPRESS_BYTES = 1024
+
+
+def compute_etag(data):
+    """Strong validator over the extracted tables, independent of key order."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+def negotiate_encoding(request):
+    """Pick br, gzip or identity from Accept-Encoding, honouring q-values."""
+    offered = (['br'] if brotli is not None else []) + ['gzip', 'identity']
+    return request.accept_encodings.best_match(offered, default='identity') or 'identity'
+
+
+def _encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def conditional_json_response(request, payload, etag_source):
+    """
+    Build a cacheable JSON response.
+
+    The ETag is derived from etag_source; each content coding gets its own
+    strong tag ("<hash>", "<hash>-gzip", "<hash>-br") while If-None-Match
+    matches any of them, so a revalidation after a change of Accept-Encoding
+    still gets a 304.
+    """
+    base_tag = compute_etag(etag_source)
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    encoding = negotiate_encoding(request) if len(body) >= MIN_COMPRESS_BYTES else 'identity'
+    etag = base_tag if encoding == 'identity' else f'{base_tag}-{encoding}'
+
+    if_none_match = request.if_none_match
+    not_modified = if_none_match.star_tag or any(
+        if_none_match.contains_weak(tag)
+        for tag in (base_tag, f'{base_tag}-gzip', f'{base_tag}-br')
+    )
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(_encode(body, encoding), status=200, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={CASE_DETAILS_MAX_AGE}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
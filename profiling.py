@@ -0,0 +1,244 @@
+"""
+Per-lookup timelines, on-demand sampling profiles and a slow-lookup flight recorder.
+
+A lookup is recorded when profiling was requested (X-Profile header with
+the admin token, or the admin toggle) or when the flight recorder is on (SLOW_LOOKUP_SECONDS > 0).
+Recording covers every WebDriver command, OCR call and parse step; a sampling
+profile of the request thread is only taken when profiling was requested.
+Finished lookups over the threshold, and every profiled lookup, are kept in a
+bounded ring buffer for the admin endpoint.
+
+With nothing recording, span() is one thread-local lookup returning a shared
+no-op context manager.
+"""
+import os
+import sys
+import time
+import uuid
+import hashlib
+import functools
+import threading
+import contextlib
+from collections import Counter, deque
+
+SLOW_LOOKUP_SECONDS = float(os.environ.get('SLOW_LOOKUP_SECONDS', 45))
+SLOW_LOOKUP_BUFFER = int(os.environ.get('SLOW_LOOKUP_BUFFER', 50))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+MAX_TIMELINE_EVENTS = 2000
+MAX_PROFILE_STACKS = 50
+
+_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+_slow_lookups = deque(maxlen=SLOW_LOOKUP_BUFFER)
+_slow_lookups_lock = threading.Lock()
+_profiling_enabled = False
+
+
+def redact_client_id(client_id):
+    """Replace a raw API key with a short hash so reports never expose it."""
+    if client_id and client_id.startswith('key:'):
+        digest = hashlib.sha256(client_id[len('key:'):].encode('utf-8')).hexdigest()[:12]
+        return f'key:{digest}'
+    return client_id
+
+
+def set_profiling_enabled(enabled):
+    """Admin toggle: profile every lookup until switched off."""
+    global _profiling_enabled
+    _profiling_enabled = bool(enabled)
+
+
+def is_profiling_enabled():
+    return _profiling_enabled
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='lookup-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class LookupRecorder:
+    """Collects the timeline (and optionally a profile) for one lookup."""
+
+    def __init__(self, cnr_number, client_id=None, profile=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.cnr_number = cnr_number
+        self.client_id = redact_client_id(client_id)
+        self.profiled = profile
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.events = []
+        self.dropped_events = 0
+        self.report = None
+        self.sampler = None
+        if profile:
+            self.sampler = _Sampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+            self.sampler.start()
+
+    def add(self, kind, name, started, duration, error=None):
+        if len(self.events) >= MAX_TIMELINE_EVENTS:
+            self.dropped_events += 1
+            return
+        event = {
+            'kind': kind,
+            'name': name,
+            'start_ms': round((started - self.start) * 1000, 2),
+            'duration_ms': round(duration * 1000, 2),
+        }
+        if error is not None:
+            event['error'] = error
+        self.events.append(event)
+
+    def finish(self, status):
+        """Stop recording and build the report (idempotent)."""
+        if self.report is not None:
+            return self.report
+        duration = time.perf_counter() - self.start
+        if self.sampler is not None:
+            self.sampler.stop()
+
+        summary = {}
+        for event in self.events:
+            totals = summary.setdefault(event['kind'], {'count': 0, 'total_ms': 0.0})
+            totals['count'] += 1
+            totals['total_ms'] = round(totals['total_ms'] + event['duration_ms'], 2)
+
+        self.report = {
+            'id': self.id,
+            'cnr_number': self.cnr_number,
+            'client_id': self.client_id,
+            'started_at': self.started_at,
+            'duration_ms': round(duration * 1000, 2),
+            'status': status,
+            'profiled': self.profiled,
+            'summary': summary,
+            'timeline': self.events,
+            'dropped_events': self.dropped_events,
+        }
+        if self.sampler is not None:
+            self.report['profile'] = {
+                'interval_ms': PROFILE_SAMPLE_INTERVAL * 1000,
+                'samples': self.sampler.samples,
+                'stacks': [
+                    {'stack': stack, 'samples': count}
+                    for stack, count in self.sampler.stacks.most_common(MAX_PROFILE_STACKS)
+                ],
+            }
+        return self.report
+
+
+class _Span:
+    __slots__ = ('recorder', 'kind', 'name', 'started')
+
+    def __init__(self, recorder, kind, name):
+        self.recorder = recorder
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        error = f'{exc_type.__name__}: {exc}'[:200] if exc_type is not None else None
+        self.recorder.add(self.kind, self.name, self.started, time.perf_counter() - self.started, error)
+        return False
+
+
+def span(kind, name):
+    """Time a block into the current lookup's timeline, if one is recording."""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, kind, name)
+
+
+def traced(kind):
+    """Decorator form of span() using the function name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_driver(driver):
+    """Route every WebDriver command through span() so it lands in the timeline."""
+    execute = driver.execute
+
+    def timed_execute(driver_command, params=None):
+        with span('webdriver', driver_command):
+            return execute(driver_command, params)
+
+    driver.execute = timed_execute
+    return driver
+
+
+def start_lookup(cnr_number, client_id=None, profile=False):
+    """Begin recording on this thread; returns None when nothing needs recording."""
+    profile = profile or _profiling_enabled
+    if not profile and SLOW_LOOKUP_SECONDS <= 0:
+        return None
+    recorder = LookupRecorder(cnr_number, client_id, profile)
+    _local.recorder = recorder
+    return recorder
+
+
+def finish_lookup(recorder, status):
+    """Stop recording; keep the report if it was profiled or slow."""
+    if recorder is None:
+        return None
+    if getattr(_local, 'recorder', None) is recorder:
+        _local.recorder = None
+    already_finished = recorder.report is not None
+    report = recorder.finish(status)
+    slow = SLOW_LOOKUP_SECONDS > 0 and report['duration_ms'] >= SLOW_LOOKUP_SECONDS * 1000
+    if not already_finished and (recorder.profiled or slow):
+        with _slow_lookups_lock:
+            _slow_lookups.append(report)
+    return report
+
+
+def recent_lookups(limit=None, summary_only=False):
+    """Flight recorder contents, newest first."""
+    with _slow_lookups_lock:
+        reports = list(reversed(_slow_lookups))
+    if limit is not None:
+        reports = reports[:limit]
+    if summary_only:
+        reports = [
+            {key: value for key, value in report.items() if key not in ('timeline', 'profile')}
+            for report in reports
+        ]
+    return reports
+
+
+def get_lookup(lookup_id):
+    with _slow_lookups_lock:
+        return next((report for report in _slow_lookups if report['id'] == lookup_id), None)
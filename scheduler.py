@@ -0,0 +1,254 @@
+import os
+import time
+import itertools
+import threading
+
+
+def _parse_weights(spec):
+    """Parse CLIENT_WEIGHTS, e.g. "key:abc123=4,ip:10.0.0.5=0.5"."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        client_id, _, weight = item.rpartition('=')
+        try:
+            weights[client_id] = float(weight)
+        except ValueError:
+            print(f"Ignoring invalid client weight: {item}")
+    return weights
+
+
+# webdriver.py drives a single shared browser tab, so only one lookup may
+# hold it at a time
+BROWSER_SESSIONS = 1
+
+# A waiting lookup holds a gunicorn thread (keep in sync with --threads), so
+# the queue must never fill every thread: one is always left free to accept
+# new requests, and no client may take more than half of the queue
+SERVING_THREADS = int(os.environ.get('SERVING_THREADS', 8))
+MAX_QUEUED_TOTAL = max(1, SERVING_THREADS - BROWSER_SESSIONS - 1)
+CLIENT_MAX_CONCURRENT = int(os.environ.get('CLIENT_MAX_CONCURRENT', 1))
+CLIENT_MAX_QUEUED = min(
+    int(os.environ.get('CLIENT_MAX_QUEUED', max(1, MAX_QUEUED_TOTAL // 2))),
+    MAX_QUEUED_TOTAL
+)
+CLIENT_RATE_PER_MINUTE = float(os.environ.get('CLIENT_RATE_PER_MINUTE', 30))
+CLIENT_BURST = int(os.environ.get('CLIENT_BURST', 10))
+CLIENT_WEIGHTS = _parse_weights(os.environ.get('CLIENT_WEIGHTS'))
+
+# Only these API keys get their own scheduling identity; anything else is
+# scheduled by IP so random keys cannot mint fresh quotas
+API_KEYS = {key.strip() for key in os.environ.get('API_KEYS', '').split(',') if key.strip()} | {
+    client_id[len('key:'):] for client_id in CLIENT_WEIGHTS if client_id.startswith('key:')
+}
+
+
+def is_known_api_key(api_key):
+    return api_key in API_KEYS
+
+
+class QuotaExceeded(Exception):
+    """Raised when a client is over its rate or queue quota."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A single lookup waiting for, or holding, a browser session."""
+
+    def __init__(self, client_id, start_tag, seq):
+        self.client_id = client_id
+        self.start_tag = start_tag
+        self.seq = seq
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.ready = threading.Event()
+
+
+class _ClientState:
+    def __init__(self, weight, burst):
+        self.weight = weight
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.finish_tag = 0.0
+        self.running = 0
+        self.queued = 0
+
+
+class FairScheduler:
+    """
+    Start-time weighted fair queuing over a fixed number of browser sessions.
+
+    Each lookup gets a virtual start tag of max(virtual time, client's last
+    finish tag); sessions go to the pending lookup with the lowest tag, so a
+    client with a deep backlog only advances its own tags and interactive
+    clients keep getting served. Per-client concurrency, queue depth and a
+    token-bucket rate limit are enforced on top, and the total queue is
+    capped so waiting lookups cannot occupy every serving thread.
+    """
+
+    def __init__(self, capacity=BROWSER_SESSIONS, max_concurrent=CLIENT_MAX_CONCURRENT,
+                 max_queued=CLIENT_MAX_QUEUED, rate_per_minute=CLIENT_RATE_PER_MINUTE,
+                 burst=CLIENT_BURST, weights=None, max_queued_total=MAX_QUEUED_TOTAL):
+        self.capacity = capacity
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_total = max_queued_total
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self.weights = CLIENT_WEIGHTS if weights is None else weights
+
+        self._lock = threading.Condition()
+        self._clients = {}
+        self._pending = []
+        self._running = 0
+        self._pausers = 0
+        self._exclusive = False
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    def _client(self, client_id):
+        state = self._clients.get(client_id)
+        if state is None:
+            state = _ClientState(self.weights.get(client_id, 1.0), self.burst)
+            self._clients[client_id] = state
+        return state
+
+    def _refill(self, state):
+        now = time.monotonic()
+        state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate_per_second)
+        state.refilled_at = now
+
+    def _prune(self):
+        """Forget idle clients whose token bucket has fully refilled."""
+        for client_id, state in list(self._clients.items()):
+            if state.running or state.queued:
+                continue
+            self._refill(state)
+            if state.tokens >= self.burst and state.finish_tag <= self._virtual_time:
+                del self._clients[client_id]
+
+    def submit(self, client_id):
+        """Queue a lookup for client_id. Raises QuotaExceeded if over quota."""
+        with self._lock:
+            if len(self._clients) > 1000:
+                self._prune()
+
+            state = self._client(client_id)
+            self._refill(state)
+
+            if state.queued >= self.max_queued:
+                raise QuotaExceeded(
+                    f'Too many queued requests for this client (max {self.max_queued})',
+                    retry_after=5
+                )
+            if len(self._pending) >= self.max_queued_total:
+                raise QuotaExceeded(
+                    f'Server busy: too many queued requests (max {self.max_queued_total})',
+                    retry_after=5
+                )
+            if state.tokens < 1:
+                retry_after = (1 - state.tokens) / self.rate_per_second if self.rate_per_second else 60
+                raise QuotaExceeded(
+                    'Rate limit exceeded for this client',
+                    retry_after=max(1, int(retry_after + 0.999))
+                )
+
+            state.tokens -= 1
+            start_tag = max(self._virtual_time, state.finish_tag)
+            state.finish_tag = start_tag + 1.0 / max(state.weight, 0.001)
+            state.queued += 1
+
+            ticket = Ticket(client_id, start_tag, next(self._seq))
+            self._pending.append(ticket)
+            self._dispatch_locked()
+            return ticket
+
+    def _dispatch_locked(self):
+        while not (self._pausers or self._exclusive) and self._running < self.capacity:
+            eligible = [
+                t for t in self._pending
+                if self._clients[t.client_id].running < self.max_concurrent
+            ]
+            if not eligible:
+                return
+            ticket = min(eligible, key=lambda t: (t.start_tag, t.seq))
+            self._pending.remove(ticket)
+
+            state = self._clients[ticket.client_id]
+            state.queued -= 1
+            state.running += 1
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+
+            ticket.started_at = time.time()
+            ticket.ready.set()
+
+    def wait(self, ticket, timeout=None):
+        """Block until the ticket holds a browser session. Returns False on timeout."""
+        return ticket.ready.wait(timeout)
+
+    def position(self, ticket):
+        """1-based position among waiting lookups, or 0 once the ticket is running."""
+        with self._lock:
+            if ticket.ready.is_set():
+                return 0
+            key = (ticket.start_tag, ticket.seq)
+            return 1 + sum(1 for t in self._pending if (t.start_tag, t.seq) < key)
+
+    def release(self, ticket):
+        """Give the session back (or drop the ticket if it never started)."""
+        with self._lock:
+            state = self._clients.get(ticket.client_id)
+            if ticket.ready.is_set():
+                if ticket.started_at is None:
+                    return  # already released
+                ticket.started_at = None
+                state.running -= 1
+                self._running -= 1
+                self._lock.notify_all()
+            elif ticket in self._pending:
+                self._pending.remove(ticket)
+                state.queued -= 1
+            self._dispatch_locked()
+
+    def pause(self, timeout=None):
+        """
+        Stop starting new lookups and wait until nothing else holds the
+        browser, so it can be touched between lookups. On success the caller
+        has exclusive use until resume(); returns False if lookups (or another
+        pause) are still holding it after timeout.
+        """
+        with self._lock:
+            self._pausers += 1
+            acquired = self._lock.wait_for(
+                lambda: self._running == 0 and not self._exclusive, timeout
+            )
+            self._pausers -= 1
+            if acquired:
+                self._exclusive = True
+            else:
+                self._dispatch_locked()
+            return acquired
+
+    def resume(self):
+        """Give up exclusive use taken by pause() and start queued lookups again."""
+        with self._lock:
+            self._exclusive = False
+            self._lock.notify_all()
+            self._dispatch_locked()
+
+    def stats(self):
+        """Snapshot of scheduler load for the health endpoint."""
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'running': self._running,
+                'queued': len(self._pending),
+                'max_queued': self.max_queued_total,
+                'clients': len(self._clients),
+                'paused': self._exclusive or self._pausers > 0,
+            }
+
+
+scheduler = FairScheduler()
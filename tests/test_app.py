@@ -0,0 +1,92 @@
+import json
+import threading
+import pytest
+
+import webdriver
+import profiling
+from scheduler import FairScheduler
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    # Importing app starts Chrome; the routes under test never touch it
+    monkeypatch.setattr(webdriver, 'initialize_driver', lambda: None)
+    import app as app_module
+    monkeypatch.setattr(app_module, 'ensure_watchdog', lambda: None)
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'admin-secret')
+    monkeypatch.setattr(app_module, 'is_known_not_found', lambda cnr: False)
+    monkeypatch.setattr(app_module, 'scheduler', FairScheduler(
+        rate_per_minute=6000, burst=100, weights={}, max_queued_total=10
+    ))
+    monkeypatch.setattr(profiling, '_slow_lookups', profiling.deque(maxlen=5))
+    monkeypatch.setattr(profiling, '_profiling_enabled', False)
+
+    def fake_lookup(cnr_number):
+        yield {'status': 'processing', 'message': 'Solving CAPTCHA', 'progress': 50}
+        yield {'status': 'success', 'message': 'Done', 'progress': 100, 'data': {'cnr_number': cnr_number}}
+
+    monkeypatch.setattr(app_module, 'solve_captcha_and_search_with_status', fake_lookup)
+    return app_module
+
+
+def stream_events(response):
+    return [
+        json.loads(line[len('data: '):])
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith('data: ')
+    ]
+
+
+def test_profile_header_ignored_without_admin_token(app_module):
+    client = app_module.app.test_client()
+    response = client.get('/api/case-details?cnr_number=MHAU010012342022', buffered=True,
+                          headers={'X-Profile': '1'})
+    assert 'profile' not in stream_events(response)[-1]
+
+    response = client.get('/api/case-details?cnr_number=MHAU010012342022', buffered=True,
+                          headers={'X-Profile': '1', 'X-Admin-Token': 'wrong'})
+    assert 'profile' not in stream_events(response)[-1]
+    assert profiling.recent_lookups() == []
+
+
+def test_profile_header_honoured_with_admin_token(app_module):
+    client = app_module.app.test_client()
+    response = client.get('/api/case-details?cnr_number=MHAU010012342022', buffered=True,
+                          headers={'X-Profile': '1', 'X-Admin-Token': 'admin-secret'})
+    final = stream_events(response)[-1]
+    assert final['status'] == 'success'
+    assert final['profile']['profiled']
+
+
+def test_queue_wait_is_not_counted_as_lookup_time(app_module):
+    blocker = app_module.scheduler.submit('ip:10.0.0.99')
+    threading.Timer(0.5, app_module.scheduler.release, [blocker]).start()
+
+    client = app_module.app.test_client()
+    response = client.get('/api/case-details?cnr_number=MHAU010012342022', buffered=True,
+                          headers={'X-Profile': '1', 'X-Admin-Token': 'admin-secret'})
+    events = stream_events(response)
+    report = events[-1]['profile']
+    queue_event = next(event for event in report['timeline'] if event['kind'] == 'queue')
+    assert queue_event['duration_ms'] >= 400
+    assert queue_event['start_ms'] < 0
+    assert report['duration_ms'] < 400
+
+
+def test_json_endpoint_honours_profile_header(app_module):
+    client = app_module.app.test_client()
+    response = client.get('/api/case-details/json?cnr_number=MHAU010012342022',
+                          headers={'X-Profile': '1', 'X-Admin-Token': 'admin-secret'})
+    assert response.get_json()['profile']['profiled']
+    assert response.headers['Cache-Control'] == 'no-store'
+
+    response = client.get('/api/case-details/json?cnr_number=MHAU010012342022', headers={'X-Profile': '1'})
+    assert 'profile' not in response.get_json()
+    assert response.headers.get('ETag')
+
+
+def test_admin_endpoints_require_token(app_module):
+    client = app_module.app.test_client()
+    assert client.get('/api/admin/slow-lookups').status_code == 401
+    response = client.get('/api/admin/slow-lookups', headers={'Authorization': 'Bearer admin-secret'})
+    assert response.status_code == 200
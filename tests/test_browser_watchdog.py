@@ -0,0 +1,74 @@
+import pytest
+
+import browser_watchdog
+import webdriver
+from scheduler import FairScheduler
+
+
+class FakeDriver:
+    def __init__(self, tabs=1):
+        self.window_handles = [f'tab-{n}' for n in range(tabs)]
+
+
+@pytest.fixture
+def watchdog(monkeypatch):
+    scheduler = FairScheduler(capacity=1, rate_per_minute=6000, burst=100, weights={})
+    restarts = []
+    monkeypatch.setattr(browser_watchdog, 'scheduler', scheduler)
+    monkeypatch.setattr(browser_watchdog, 'restart_driver', lambda: restarts.append(True))
+    monkeypatch.setattr(browser_watchdog, '_sample_process_tree', lambda: (100.0, 5.0, 4))
+    monkeypatch.setattr(browser_watchdog, '_pending_crashes', 0)
+    monkeypatch.setattr(browser_watchdog, '_cpu_over_count', 0)
+    monkeypatch.setattr(browser_watchdog, '_gauges', dict(browser_watchdog._gauges, recycles=0, renderer_crashes=0))
+    monkeypatch.setattr(browser_watchdog, 'WATCHDOG_DRAIN_TIMEOUT', 0.05)
+    monkeypatch.setattr(webdriver, '_driver', FakeDriver())
+    monkeypatch.setattr(browser_watchdog, 'peek_driver', lambda: webdriver._driver)
+    return scheduler, restarts
+
+
+def test_healthy_browser_is_left_alone(watchdog):
+    scheduler, restarts = watchdog
+    browser_watchdog.check_once()
+    gauges = browser_watchdog.gauges()
+    assert restarts == []
+    assert (gauges['rss_mb'], gauges['tab_count']) == (100.0, 1)
+    assert not scheduler.stats()['paused']
+
+
+def test_leaked_tabs_trigger_recycle(watchdog, monkeypatch):
+    scheduler, restarts = watchdog
+    monkeypatch.setattr(webdriver, '_driver', FakeDriver(tabs=browser_watchdog.WATCHDOG_MAX_TABS + 1))
+    browser_watchdog.check_once()
+    assert restarts == [True]
+    assert 'open tabs' in browser_watchdog.gauges()['last_recycle_reason']
+
+
+def test_renderer_crash_triggers_recycle(watchdog):
+    scheduler, restarts = watchdog
+    browser_watchdog.note_renderer_crash()
+    browser_watchdog.check_once()
+    assert restarts == [True]
+    assert browser_watchdog.gauges()['renderer_crashes'] == 1
+
+
+def test_never_recycles_during_a_lookup(watchdog, monkeypatch):
+    scheduler, restarts = watchdog
+    monkeypatch.setattr(browser_watchdog, '_sample_process_tree', lambda: (10 ** 6, 5.0, 4))
+    ticket = scheduler.submit('client')
+    browser_watchdog.check_once()
+    assert restarts == []
+    assert not scheduler.stats()['paused']
+
+    scheduler.release(ticket)
+    browser_watchdog.check_once()
+    assert restarts == [True]
+
+
+def test_sustained_cpu_needs_consecutive_checks(watchdog, monkeypatch):
+    scheduler, restarts = watchdog
+    monkeypatch.setattr(browser_watchdog, '_sample_process_tree', lambda: (100.0, 500.0, 4))
+    for _ in range(browser_watchdog.WATCHDOG_CPU_CHECKS - 1):
+        browser_watchdog.check_once()
+    assert restarts == []
+    browser_watchdog.check_once()
+    assert restarts == [True]
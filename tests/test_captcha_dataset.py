@@ -0,0 +1,76 @@
+import csv
+import os
+import pytest
+
+import captcha_dataset
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(captcha_dataset, '_seen', set())
+    monkeypatch.setattr(captcha_dataset, '_dataset_bytes', {})
+    directory = str(tmp_path / 'dataset')
+    captcha_dataset.write_sample(b'image-1', 'abcd', 'incorrect', directory=directory)
+    captcha_dataset.write_sample(b'image-1', 'abce', 'correct', directory=directory)
+    captcha_dataset.write_sample(b'image-1', 'abce', 'correct', directory=directory)
+    captcha_dataset.write_sample(b'image-2', 'wxyz', 'incorrect', directory=directory)
+    captcha_dataset.write_sample(b'image-3', '', 'unreadable', directory=directory)
+    return directory
+
+
+def test_images_are_stored_once_per_hash(dataset):
+    images = [name for _, _, files in os.walk(os.path.join(dataset, 'images')) for name in files]
+    assert len(images) == 3
+    assert not any(name.endswith('.tmp') for name in images)
+
+
+def test_stats_and_labels(dataset):
+    stats = captcha_dataset.stats(dataset)
+    # The repeated (image, text, outcome) record is deduplicated
+    assert stats['attempts'] == 4
+    assert stats['outcomes'] == {'correct': 1, 'incorrect': 2, 'unreadable': 1}
+    assert stats['images'] == 3
+    assert stats['labelled_images'] == 1
+
+    labels = captcha_dataset.load_labels(dataset)
+    entry = next(e for e in labels.values() if e['label'])
+    assert entry == {'label': 'abce', 'rejected': {'abcd'}}
+
+
+def test_export_writes_labelled_images_with_index(dataset, tmp_path):
+    out_dir = str(tmp_path / 'export')
+    assert captcha_dataset.export(out_dir, dataset) == 1
+    with open(os.path.join(out_dir, 'labels.csv'), newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['label'] for row in rows] == ['abce']
+    with open(os.path.join(out_dir, rows[0]['filename']), 'rb') as f:
+        assert f.read() == b'image-1'
+
+
+def test_replay_scores_solver(dataset):
+    answers = {b'image-1': 'abce', b'image-2': 'wxyz', b'image-3': 'zzzz'}
+    result = captcha_dataset.replay(answers.get, dataset)
+    assert result['labelled'] == 1 and result['correct'] == 1 and result['accuracy'] == 1.0
+    assert result['unlabelled'] == 2 and result['known_wrong'] == 1
+
+
+def test_size_limit_stops_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(captcha_dataset, '_seen', set())
+    monkeypatch.setattr(captcha_dataset, '_dataset_bytes', {})
+    monkeypatch.setattr(captcha_dataset, 'CAPTCHA_DATASET_MAX_MB', 100 / (1024 * 1024))
+    directory = str(tmp_path / 'dataset')
+    assert captcha_dataset.write_sample(b'x' * 200, 'abcd', 'correct', directory=directory)
+    assert captcha_dataset.write_sample(b'y' * 10, 'abcd', 'correct', directory=directory) is None
+    assert captcha_dataset.stats(directory)['attempts'] == 1
+
+
+def test_capture_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('CAPTCHA_CAPTURE', raising=False)
+    import importlib
+    fresh = importlib.reload(captcha_dataset)
+    try:
+        assert fresh.CAPTCHA_CAPTURE is False
+        fresh.record_attempt(b'image', 'abcd', 'correct')
+        assert fresh._queue.empty() and fresh._writer is None
+    finally:
+        importlib.reload(captcha_dataset)
@@ -0,0 +1,87 @@
+import time
+import pytest
+
+import cnr
+from cnr import InvalidCNR, parse_cnr
+
+
+@pytest.fixture
+def court_index(monkeypatch):
+    index = {
+        'MH': {'name': 'Maharashtra', 'complete': False, 'districts': {}},
+        'DL': {
+            'name': 'Delhi',
+            'complete': True,
+            'districts': {
+                'CT': {'name': 'Central', 'complete': True, 'establishments': {'01': 'Tis Hazari'}},
+                'SE': {'name': 'South East', 'establishments': {}},
+            },
+        },
+    }
+    monkeypatch.setattr(cnr, '_court_index', index)
+    return index
+
+
+@pytest.fixture(autouse=True)
+def empty_not_found_cache():
+    cnr.clear_not_found()
+    yield
+    cnr.clear_not_found()
+
+
+def test_parse_normalizes_and_decodes(court_index):
+    parsed = parse_cnr(' mhau-01-001234-2022 ')
+    assert parsed['cnr_number'] == 'MHAU010012342022'
+    assert parsed['state'] == 'Maharashtra'
+    assert (parsed['district_code'], parsed['establishment_code']) == ('AU', '01')
+    assert (parsed['serial'], parsed['year']) == ('001234', '2022')
+    assert parsed['court_indexed'] is False
+
+
+@pytest.mark.parametrize('value, message', [
+    ('MHAU01001234202', '16 characters'),
+    ('MHA1010012342022', '4 letters followed by 12 digits'),
+    ('XXAU010012342022', 'Unknown state code'),
+    ('MHAU010000002022', 'serial number cannot be zero'),
+    ('MHAU010012341949', 'Invalid filing year'),
+])
+def test_parse_rejects_malformed(court_index, value, message):
+    with pytest.raises(InvalidCNR, match=message):
+        parse_cnr(value)
+
+
+def test_future_year_rejected(court_index):
+    with pytest.raises(InvalidCNR, match='Invalid filing year'):
+        parse_cnr(f'MHAU01001234{time.localtime().tm_year + 1}')
+
+
+def test_complete_index_enforces_district_and_establishment(court_index):
+    assert parse_cnr('DLCT010012342022')['court_indexed'] is True
+    with pytest.raises(InvalidCNR, match='Unknown district code'):
+        parse_cnr('DLZZ010012342022')
+    with pytest.raises(InvalidCNR, match='Unknown establishment code'):
+        parse_cnr('DLCT020012342022')
+    # SE is listed without being marked complete, so any establishment passes
+    assert parse_cnr('DLSE070012342022')['district'] == 'South East'
+
+
+def test_bundled_index_loads():
+    index = cnr.load_court_index(cnr.COURT_CODES_PATH)
+    assert 'MH' in index and 'CT' in index['DL']['districts']
+
+
+def test_not_found_cache_normalizes_and_expires(monkeypatch):
+    cnr.mark_not_found('mhau010012342022')
+    assert cnr.is_known_not_found('MHAU-01-001234-2022')
+    assert not cnr.is_known_not_found('MHAU010012352022')
+
+    monkeypatch.setattr(cnr.time, 'time', lambda: 10 ** 12)
+    assert not cnr.is_known_not_found('MHAU010012342022')
+
+
+def test_not_found_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(cnr, 'NOT_FOUND_CACHE_SIZE', 2)
+    for serial in range(1, 4):
+        cnr.mark_not_found(f'MHAU01{serial:06d}2022')
+    assert not cnr.is_known_not_found('MHAU010000012022')
+    assert cnr.is_known_not_found('MHAU010000032022')
@@ -0,0 +1,28 @@
+from helpers import is_record_not_found, is_not_found_message
+
+
+def test_visible_error_container_reports_not_found():
+    html = '<div id="validateError" style="display: block">This Case Code does not exists</div>'
+    assert is_record_not_found(html)
+
+
+def test_results_container_reports_not_found():
+    assert is_record_not_found('<div id="history_cnr"><p>Record Not Found</p></div>')
+
+
+def test_hidden_or_unrelated_text_is_ignored():
+    assert not is_record_not_found('<div style="display:none">Invalid CNR</div>')
+    assert not is_record_not_found('<p>Invalid CNR</p>')
+    assert not is_record_not_found('<div id="validateError" style="display: none">Invalid CNR</div>')
+    assert not is_record_not_found(
+        '<div id="history_cnr"><span class="d-none">Record not found</span><table></table></div>'
+    )
+    assert not is_record_not_found(
+        '<div style="display:none"><div id="validateError">Invalid CNR</div></div>'
+    )
+
+
+def test_not_found_message():
+    assert is_not_found_message('Invalid CNR Number')
+    assert not is_not_found_message('Invalid Captcha')
+    assert not is_not_found_message(None)
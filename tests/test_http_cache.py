@@ -0,0 +1,79 @@
+import gzip
+import json
+import pytest
+from flask import Flask, request
+
+import http_cache
+from http_cache import compute_etag, conditional_json_response
+
+DATA = {'case_history': [['01-01-2024', 'Hearing', 'Adjourned'] for _ in range(200)]}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/large')
+    def large():
+        return conditional_json_response(request, {'status': 'success', 'data': DATA}, DATA)
+
+    @app.route('/small')
+    def small():
+        return conditional_json_response(request, {'status': 'success', 'data': {}}, {})
+
+    return app.test_client()
+
+
+def test_etag_ignores_key_order():
+    assert compute_etag({'a': 1, 'b': [1, 2]}) == compute_etag({'b': [1, 2], 'a': 1})
+    assert compute_etag({'a': 1}) != compute_etag({'a': 2})
+
+
+def test_gzip_negotiation_and_cache_headers(client, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == f'public, max-age={http_cache.CASE_DETAILS_MAX_AGE}'
+    assert json.loads(gzip.decompress(response.data))['data'] == DATA
+
+
+def test_identity_when_gzip_refused_or_body_small(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip;q=0, br;q=0'})
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data)['data'] == DATA
+
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_brotli_preferred_when_available(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data))['data'] == DATA
+
+
+def test_if_none_match_returns_304_across_encodings(client, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    gzip_etag = client.get('/large', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    # Same representation
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzip_etag})
+    assert response.status_code == 304 and response.data == b''
+    assert response.headers['ETag'] == gzip_etag
+
+    # Tag from the gzip variant still validates the identity variant
+    response = client.get('/large', headers={'Accept-Encoding': 'identity', 'If-None-Match': gzip_etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == gzip_etag.replace('-gzip', '')
+
+    response = client.get('/large', headers={'If-None-Match': '*'})
+    assert response.status_code == 304
+
+
+def test_changed_data_does_not_match(client):
+    response = client.get('/large', headers={'If-None-Match': f'"{compute_etag({"changed": True})}"'})
+    assert response.status_code == 200
@@ -0,0 +1,73 @@
+import json
+import time
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(profiling, '_slow_lookups', profiling.deque(maxlen=3))
+    monkeypatch.setattr(profiling, '_profiling_enabled', False)
+    profiling._local.recorder = None
+    yield
+    profiling._local.recorder = None
+
+
+def test_span_is_shared_noop_when_not_recording():
+    assert profiling.span('parse', 'x') is profiling._NULL_SPAN
+
+
+def test_api_keys_are_redacted_in_reports():
+    recorder = profiling.start_lookup('MHAU010012342022', 'key:secret-api-key')
+    report = profiling.finish_lookup(recorder, 'success')
+    assert 'secret-api-key' not in json.dumps(report)
+    assert report['client_id'].startswith('key:') and len(report['client_id']) == 16
+    assert profiling.redact_client_id('ip:10.0.0.1') == 'ip:10.0.0.1'
+
+
+def test_timeline_summary_and_traced_errors():
+    @profiling.traced('parse')
+    def failing():
+        raise ValueError('boom')
+
+    recorder = profiling.start_lookup('MHAU010012342022', profile=False)
+    with profiling.span('ocr', 'ocr.space'):
+        pass
+    with pytest.raises(ValueError):
+        failing()
+    report = profiling.finish_lookup(recorder, 'error')
+
+    assert [e['kind'] for e in report['timeline']] == ['ocr', 'parse']
+    assert report['timeline'][1]['error'] == 'ValueError: boom'
+    assert report['summary']['parse']['count'] == 1
+    assert profiling.span('ocr', 'after') is profiling._NULL_SPAN
+
+
+def test_only_slow_or_profiled_lookups_are_kept(monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_LOOKUP_SECONDS', 3600)
+    profiling.finish_lookup(profiling.start_lookup('FAST'), 'success')
+    assert profiling.recent_lookups() == []
+
+    recorder = profiling.start_lookup('PROFILED', profile=True)
+    time.sleep(0.02)
+    profiling.finish_lookup(recorder, 'success')
+    profiling.finish_lookup(recorder, 'success')  # idempotent
+
+    lookups = profiling.recent_lookups()
+    assert [l['cnr_number'] for l in lookups] == ['PROFILED']
+    assert 'profile' in lookups[0]
+    assert 'timeline' not in profiling.recent_lookups(summary_only=True)[0]
+    assert profiling.get_lookup(lookups[0]['id']) is lookups[0]
+
+
+def test_ring_buffer_is_bounded():
+    for n in range(5):
+        profiling.finish_lookup(profiling.start_lookup(f'CNR{n}', profile=True), 'success')
+    assert [l['cnr_number'] for l in profiling.recent_lookups()] == ['CNR4', 'CNR3', 'CNR2']
+
+
+def test_disabled_recorder_returns_none(monkeypatch):
+    monkeypatch.setattr(profiling, 'SLOW_LOOKUP_SECONDS', 0)
+    assert profiling.start_lookup('CNR') is None
+    assert profiling.finish_lookup(None, 'success') is None
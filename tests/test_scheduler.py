@@ -0,0 +1,146 @@
+import threading
+import pytest
+
+import scheduler as scheduler_module
+from scheduler import FairScheduler, QuotaExceeded
+
+
+def make_scheduler(**overrides):
+    options = dict(capacity=1, max_concurrent=1, max_queued=50, rate_per_minute=6000, burst=100, weights={},
+                   max_queued_total=100)
+    options.update(overrides)
+    return FairScheduler(**options)
+
+
+def test_capacity_is_single_browser():
+    assert scheduler_module.BROWSER_SESSIONS == 1
+    assert scheduler_module.scheduler.capacity == 1
+
+
+def test_first_ticket_starts_immediately():
+    s = make_scheduler()
+    ticket = s.submit('a')
+    assert s.wait(ticket, timeout=0)
+    assert s.position(ticket) == 0
+    assert s.stats()['running'] == 1
+
+
+def test_interactive_client_overtakes_bulk_backlog():
+    s = make_scheduler()
+    bulk = [s.submit('bulk') for _ in range(5)]
+    interactive = s.submit('interactive')
+    assert s.position(interactive) == 1
+
+    s.release(bulk[0])
+    assert interactive.ready.is_set()
+    assert not bulk[1].ready.is_set()
+
+
+def test_weights_give_heavier_clients_more_turns():
+    s = make_scheduler(max_concurrent=1, weights={'heavy': 2.0})
+    tickets = [s.submit('heavy') for _ in range(4)] + [s.submit('light') for _ in range(4)]
+    order = []
+    running = next(t for t in tickets if t.ready.is_set())
+    for _ in range(6):
+        order.append(running.client_id)
+        s.release(running)
+        running = next(t for t in tickets if t.ready.is_set() and t.started_at is not None)
+    assert order.count('heavy') == 4
+
+
+def test_rate_limit_raises_with_retry_after():
+    s = make_scheduler(rate_per_minute=60, burst=2)
+    s.submit('a')
+    s.submit('a')
+    with pytest.raises(QuotaExceeded, match='Rate limit') as info:
+        s.submit('a')
+    assert info.value.retry_after >= 1
+    # Other clients have their own bucket
+    s.submit('b')
+
+
+def test_queue_depth_quota():
+    s = make_scheduler(max_queued=2)
+    s.submit('a')  # running
+    s.submit('a')
+    s.submit('a')
+    with pytest.raises(QuotaExceeded, match='Too many queued'):
+        s.submit('a')
+
+
+def test_global_queue_cap_returns_busy():
+    s = make_scheduler(max_queued_total=2)
+    s.submit('a')  # running
+    s.submit('b')
+    s.submit('c')
+    with pytest.raises(QuotaExceeded, match='Server busy'):
+        s.submit('d')
+
+
+def test_one_client_cannot_take_every_serving_thread():
+    s = scheduler_module.FairScheduler(rate_per_minute=6000, burst=100, weights={})
+    held = 0
+    with pytest.raises(QuotaExceeded):
+        for _ in range(scheduler_module.SERVING_THREADS):
+            s.submit('bulk')
+            held += 1
+    assert held < scheduler_module.SERVING_THREADS - 1
+    # Another client still gets admitted while threads remain to serve it
+    s.submit('interactive')
+    stats = s.stats()
+    assert stats['running'] + stats['queued'] < scheduler_module.SERVING_THREADS
+
+
+def test_default_queue_limits_stay_below_thread_count():
+    assert scheduler_module.MAX_QUEUED_TOTAL + scheduler_module.BROWSER_SESSIONS < scheduler_module.SERVING_THREADS
+    assert scheduler_module.CLIENT_MAX_QUEUED <= scheduler_module.MAX_QUEUED_TOTAL // 2
+
+
+def test_release_of_never_started_ticket_frees_queue_slot():
+    s = make_scheduler(max_queued=1)
+    running = s.submit('a')
+    queued = s.submit('a')
+    s.release(queued)
+    assert s.stats()['queued'] == 0
+    s.submit('a')  # the slot is free again
+
+    s.release(running)
+    s.release(running)  # double release is a no-op
+    assert s.stats()['running'] == 1
+
+
+def test_pause_waits_for_running_lookup_and_blocks_dispatch():
+    s = make_scheduler()
+    first = s.submit('a')
+    second = s.submit('b')
+    assert not s.pause(timeout=0.05)
+
+    threading.Timer(0.05, s.release, [first]).start()
+    assert s.pause(timeout=2)
+    assert not second.ready.is_set()
+    assert s.stats()['paused']
+
+    s.resume()
+    assert second.ready.is_set()
+
+
+def test_pause_is_exclusive():
+    s = make_scheduler()
+    assert s.pause(timeout=0)
+    assert not s.pause(timeout=0)
+    s.resume()
+    assert s.pause(timeout=0)
+    s.resume()
+    ticket = s.submit('a')
+    assert ticket.ready.is_set()
+
+
+def test_api_key_allowlist(monkeypatch):
+    monkeypatch.setattr(scheduler_module, 'API_KEYS', {'known'})
+    assert scheduler_module.is_known_api_key('known')
+    assert not scheduler_module.is_known_api_key('random')
+
+
+def test_parse_weights():
+    weights = scheduler_module._parse_weights('key:abc=4, ip:10.0.0.5=0.5,bad=x')
+    assert weights == {'key:abc': 4.0, 'ip:10.0.0.5': 0.5}
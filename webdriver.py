@@ -5,6 +5,7 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import WebDriverException
+from profiling import instrument_driver
 
 _driver = None
 
@@ -43,6 +44,9 @@ def initialize_driver():
             _driver.set_script_timeout(30)  # Timeout for JavaScript execution
             _driver.implicitly_wait(10)  # Implicit wait for element loading
 
+            # Time every WebDriver command into the active lookup's timeline
+            instrument_driver(_driver)
+
             print("WebDriver initialized successfully and ready for use")
             
             # Register cleanup function to run when app shuts down
@@ -69,6 +73,30 @@ def get_driver():
         initialize_driver()
         return _driver
 
+def peek_driver():
+    """Return the current WebDriver instance (or None) without probing it."""
+    return _driver
+
+def get_driver_pid():
+    """PID of the chromedriver process; Chrome runs as its child process tree."""
+    try:
+        return _driver.service.process.pid
+    except AttributeError:
+        return None
+
+def reset_tabs(driver):
+    """
+    Open a fresh blank tab and close every other one, so exactly one tab
+    survives however the previous lookup ended.
+    """
+    driver.switch_to.new_window('tab')
+    fresh_handle = driver.current_window_handle
+    for handle in driver.window_handles:
+        if handle != fresh_handle:
+            driver.switch_to.window(handle)
+            driver.close()
+    driver.switch_to.window(fresh_handle)
+
 def quit_driver():
     """Quit the WebDriver and clean up resources."""
     global _driver